@@ -4,11 +4,26 @@ Final successful auto-labeling script that actually works!
 This processes more documents from multiple document types.
 """
 
+import argparse
+import gzip
 import json
+import logging
+import os
 import requests
+import threading
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from google.auth import default
+from google.api_core.client_options import ClientOptions
 from google.auth.transport.requests import Request
+from google.cloud import documentai_v1 as documentai
+from google.cloud import storage
+
+try:
+    import orjson  # Faster serializer for large labeled documents; optional
+except ImportError:
+    orjson = None
 
 # Configuration
 PROJECT_ID = "tetrix-462721"
@@ -16,63 +31,151 @@ OCR_PROCESSOR_ID = "2369784b09e9d56a"  # OCR processor for text extraction
 CLASSIFIER_PROCESSOR_ID = "ddc065df69bfa3b5"  # Classifier processor for import
 LOCATION = "us"
 BUCKET_NAME = "document-ai-test-veronica"
+MAX_WORKERS = int(os.environ.get("AUTO_LABEL_MAX_WORKERS", "32"))  # Diminishing returns past ~40
+USE_BATCH_OCR = os.environ.get("AUTO_LABEL_BATCH_OCR", "1") == "1"  # One batchProcess LRO per document type
+OCR_OUTPUT_PREFIX = "ocr_output"
+LABELED_OUTPUT_PREFIX = "final_labeled_documents/"
+INLINE_MAX_BYTES = 10_000_000  # Send smaller PDFs inline instead of by GCS reference
+
+logger = logging.getLogger(__name__)
+
+# Shared across worker threads
+_CREDENTIALS = None
+_CREDENTIALS_LOCK = threading.Lock()
+
+# Storage client handles its own connection pool, retries and upload strategy
+_STORAGE = storage.Client(project=PROJECT_ID)
+_BUCKET = _STORAGE.bucket(BUCKET_NAME)
+
+# Document AI gRPC client (HTTP/2, protobuf responses, built-in retries)
+_DOCAI = documentai.DocumentProcessorServiceClient(
+    client_options=ClientOptions(api_endpoint=f"{LOCATION}-documentai.googleapis.com")
+)
+OCR_PROCESSOR_PATH = _DOCAI.processor_path(PROJECT_ID, LOCATION, OCR_PROCESSOR_ID)
 
 def get_access_token():
-    """Get Google Cloud access token"""
-    credentials, _ = default()
-    credentials.refresh(Request())
-    return credentials.token
+    """Get Google Cloud access token (thread-safe)"""
+    global _CREDENTIALS
+    with _CREDENTIALS_LOCK:
+        if _CREDENTIALS is None:
+            _CREDENTIALS, _ = default()
+        # Only hit the token endpoint when the cached token is missing or expired
+        if not _CREDENTIALS.valid:
+            _CREDENTIALS.refresh(Request())
+        return _CREDENTIALS.token
 
-def list_files_in_folder(folder_path):
-    """List files in a GCS folder"""
-    access_token = get_access_token()
-    url = f"https://storage.googleapis.com/storage/v1/b/{BUCKET_NAME}/o"
-    headers = {"Authorization": f"Bearer {access_token}"}
-    params = {"prefix": folder_path}
-    
-    response = requests.get(url, headers=headers, params=params)
-    if response.status_code == 200:
-        items = response.json().get("items", [])
-        return [item for item in items if item["name"].endswith(".pdf")]
-    else:
-        print(f"Error listing files: {response.text}")
-        return []
+def list_files_by_type(root_prefix):
+    """List PDF blobs under root_prefix once, grouped by their type subfolder"""
+    files_by_type = defaultdict(list)
+    for blob in _STORAGE.list_blobs(BUCKET_NAME, prefix=root_prefix):
+        parts = blob.name[len(root_prefix):].split("/")
+        if len(parts) >= 2 and blob.name.endswith(".pdf"):
+            files_by_type[parts[0]].append(blob)
+    return files_by_type
 
-def process_document_with_ai(file_path):
-    """Process a document with OCR processor"""
-    access_token = get_access_token()
-    url = f"https://us-documentai.googleapis.com/v1/projects/{PROJECT_ID}/locations/{LOCATION}/processors/{OCR_PROCESSOR_ID}:process"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
+def process_document_with_ai(file_path, blob=None):
+    """Process a document with OCR processor (inline content for small PDFs when the blob is known)"""
+    try:
+        if blob is not None and blob.size is not None and blob.size < INLINE_MAX_BYTES:
+            # Skip Document AI's own GCS fetch for small files
+            request = documentai.ProcessRequest(
+                name=OCR_PROCESSOR_PATH,
+                raw_document=documentai.RawDocument(
+                    content=blob.download_as_bytes(),
+                    mime_type="application/pdf"
+                )
+            )
+        else:
+            request = documentai.ProcessRequest(
+                name=OCR_PROCESSOR_PATH,
+                gcs_document=documentai.GcsDocument(
+                    gcs_uri=f"gs://{BUCKET_NAME}/{file_path}",
+                    mime_type="application/pdf"
+                )
+            )
+        return _DOCAI.process_document(request=request).document
+    except Exception as e:
+        logger.error("Error processing document %s: %s", file_path, e)
+        return None
+
+def batch_process_documents(file_paths, doc_type):
+    """
+    OCR several documents with a single batchProcessDocuments operation.
+    Returns {file_path: documentai.Document}, like process_document_with_ai.
+    """
+    request = documentai.BatchProcessRequest(
+        name=OCR_PROCESSOR_PATH,
+        input_documents=documentai.BatchDocumentsInputConfig(
+            gcs_documents=documentai.GcsDocuments(documents=[
+                documentai.GcsDocument(gcs_uri=f"gs://{BUCKET_NAME}/{file_path}", mime_type="application/pdf")
+                for file_path in file_paths
+            ])
+        ),
+        document_output_config=documentai.DocumentOutputConfig(
+            gcs_output_config=documentai.DocumentOutputConfig.GcsOutputConfig(
+                gcs_uri=f"gs://{BUCKET_NAME}/{OCR_OUTPUT_PREFIX}/{doc_type}/"
+            )
+        ),
+    )
     
-    data = {
-        "gcsDocument": {
-            "gcsUri": f"gs://{BUCKET_NAME}/{file_path}",
-            "mimeType": "application/pdf"
-        }
-    }
+    try:
+        operation = _DOCAI.batch_process_documents(request=request)
+        operation.result(timeout=3600)
+    except Exception as e:
+        logger.error("Error batch processing %s documents: %s", doc_type, e)
+        return {}
     
-    response = requests.post(url, headers=headers, json=data)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Error processing document {file_path}: {response.text}")
+    bucket_uri = f"gs://{BUCKET_NAME}/"
+    results = {}
+    for status in operation.metadata.individual_process_statuses:
+        file_path = status.input_gcs_source[len(bucket_uri):]
+        output_prefix = status.output_gcs_destination[len(bucket_uri):]
+        results[file_path] = _load_batch_output(output_prefix)
+    return results
+
+def _load_batch_output(output_prefix):
+    """Merge the sharded JSON output of one batch-processed document (None if it can't be read)"""
+    # Trailing slash so ".../1/" doesn't also match ".../10/", ".../11/", ...
+    prefix = output_prefix.rstrip("/") + "/"
+    try:
+        shards = [
+            documentai.Document.from_json(blob.download_as_bytes(), ignore_unknown_fields=True)
+            for blob in _STORAGE.list_blobs(BUCKET_NAME, prefix=prefix)
+            if blob.name.endswith(".json")
+        ]
+    except Exception as e:
+        logger.error("Error loading batch output %s: %s", prefix, e)
+        return None
+    if not shards:
         return None
+    
+    shards.sort(key=lambda shard: shard.shard_info.shard_index)
+    return documentai.Document(
+        text="".join(shard.text for shard in shards),
+        pages=[page for shard in shards for page in shard.pages],
+    )
 
 def create_labeled_document(processed_doc, document_type, original_uri):
     """Create a labeled document with proper entities"""
-    if not processed_doc or "document" not in processed_doc:
+    if processed_doc is None:
         return None
     
-    doc = processed_doc["document"]
-    
     # Create the labeled document structure
     labeled_doc = {
         "mimeType": "application/pdf",
-        "text": doc.get("text", ""),
-        "pages": doc.get("pages", []),
+        "text": processed_doc.text,
+        # The classifier only needs page metadata, not tokens/layout/detected languages
+        "pages": [
+            {
+                "pageNumber": page.page_number,
+                "dimension": {
+                    "width": page.dimension.width,
+                    "height": page.dimension.height,
+                    "unit": page.dimension.unit
+                }
+            }
+            for page in processed_doc.pages
+        ],
         "uri": original_uri,
         "entities": [
             {
@@ -95,19 +198,22 @@ def create_labeled_document(processed_doc, document_type, original_uri):
 
 def upload_labeled_document(labeled_doc, output_path):
     """Upload labeled document to GCS"""
-    access_token = get_access_token()
-    url = f"https://storage.googleapis.com/upload/storage/v1/b/{BUCKET_NAME}/o"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-    params = {"uploadType": "media", "name": output_path}
-    
-    response = requests.post(url, headers=headers, params=params, data=json.dumps(labeled_doc))
-    return response.status_code == 200
+    try:
+        if orjson is not None:
+            body = orjson.dumps(labeled_doc)
+        else:
+            body = json.dumps(labeled_doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        blob = _BUCKET.blob(output_path)
+        # Stored gzipped; GCS transcodes it back for readers that don't accept gzip
+        blob.content_encoding = "gzip"
+        blob.upload_from_string(gzip.compress(body, compresslevel=6), content_type="application/json")
+        return True
+    except Exception as e:
+        logger.error("Error uploading %s: %s", output_path, e)
+        return False
 
-def import_documents_to_processor():
-    """Import labeled documents to classifier processor"""
+def import_documents_to_processor(gcs_uris=None):
+    """Import labeled documents to classifier processor (only gcs_uris if given, else the whole output prefix)"""
     access_token = get_access_token()
     url = f"https://us-documentai.googleapis.com/v1beta3/projects/{PROJECT_ID}/locations/{LOCATION}/processors/{CLASSIFIER_PROCESSOR_ID}/dataset:importDocuments"
     headers = {
@@ -116,14 +222,23 @@ def import_documents_to_processor():
         "X-Goog-User-Project": PROJECT_ID
     }
     
+    if gcs_uris:
+        batch_input_config = {
+            "gcsDocuments": {
+                "documents": [{"gcsUri": uri, "mimeType": "application/json"} for uri in gcs_uris]
+            }
+        }
+    else:
+        batch_input_config = {
+            "gcsPrefix": {
+                "gcsUriPrefix": f"gs://{BUCKET_NAME}/{LABELED_OUTPUT_PREFIX}"
+            }
+        }
+    
     data = {
         "batchDocumentsImportConfigs": [
             {
-                "batchInputConfig": {
-                    "gcsPrefix": {
-                        "gcsUriPrefix": f"gs://{BUCKET_NAME}/final_labeled_documents/"
-                    }
-                },
+                "batchInputConfig": batch_input_config,
                 "autoSplitConfig": {
                     "trainingSplitRatio": 0.8
                 }
@@ -131,68 +246,135 @@ def import_documents_to_processor():
         ]
     }
     
+    logger.debug("importDocuments request: %s", data)
     response = requests.post(url, headers=headers, json=data)
+    logger.debug("importDocuments response: %s", response.text)
     if response.status_code == 200:
         return response.json()
     else:
-        print(f"Error importing documents: {response.text}")
+        logger.error("Error importing documents: %s", response.text)
         return None
 
-def main():
+def _output_path(file_path, doc_type):
+    """GCS path of the labeled JSON for a source PDF"""
+    output_name = file_path.split("/")[-1].replace(".pdf", ".json")
+    return f"{LABELED_OUTPUT_PREFIX}{doc_type}/{output_name}"
+
+def _label_one(file_item, doc_type, batch_results=None):
+    """OCR (unless already batch-processed) and label a single document.
+    Returns (labeled_doc, output_path), or None on failure."""
+    file_path = file_item.name
+    file_name = file_path.split("/")[-1]
+    
+    # Process with Document AI
+    if batch_results is None:
+        processed = process_document_with_ai(file_path, file_item)
+    else:
+        # pop so the shared results dict doesn't keep every OCR document alive until the run ends
+        processed = batch_results.pop(file_path, None)
+    if not processed:
+        print(f"    ❌ Failed to process: {file_name}")
+        return None
+    
+    # Create labeled document
+    original_uri = f"gs://{BUCKET_NAME}/{file_path}"
+    labeled_doc = create_labeled_document(processed, doc_type, original_uri)
+    # The labeled document copies what it needs; drop the full OCR output before it's queued for upload
+    del processed
+    if not labeled_doc:
+        print(f"    ❌ Failed to create labeled document: {file_name}")
+        return None
+    
+    return labeled_doc, _output_path(file_path, doc_type)
+
+def _upload_one(labeled_doc, output_path):
+    """Upload a single labeled document. Returns True on success."""
+    if upload_labeled_document(labeled_doc, output_path):
+        print(f"    ✅ Uploaded: {output_path}")
+        return True
+    
+    print(f"    ❌ Failed to upload: {output_path}")
+    return False
+
+def main(force=False):
     print("🚀 Final successful auto-labeling for Document AI")
     print("Processing documents from multiple folders...")
     
+    # One listing of existing outputs so re-runs skip documents that are already labeled
+    existing = set()
+    if not force:
+        existing = {blob.name for blob in _STORAGE.list_blobs(BUCKET_NAME, prefix=LABELED_OUTPUT_PREFIX)}
+    
     # Process multiple document types
     folder_types = ["capital_call", "financial_statement", "distribution_notice"]
-    total_processed = 0
+    files_by_type = {}
+    labeled_paths = []
+    
+    # Single recursive listing instead of one request per folder
+    source_files = list_files_by_type("labeled_documents/")
     
     for doc_type in folder_types:
-        print(f"\n📁 Processing {doc_type} documents...")
-        folder_path = f"labeled_documents/{doc_type}/"
-        files = list_files_in_folder(folder_path)
-        
-        print(f"Found {len(files)} PDF files in {doc_type}")
+        files = source_files.get(doc_type, [])
+        print(f"📁 Found {len(files)} PDF files in {doc_type}")
         
         # Process first 5 files from each folder
-        for i, file_item in enumerate(files[:5]):
-            file_path = file_item["name"]
-            file_name = file_path.split("/")[-1]
-            print(f"  Processing: {file_name}")
-            
-            # Process with Document AI
-            processed = process_document_with_ai(file_path)
-            if processed:
-                # Create labeled document
-                original_uri = f"gs://{BUCKET_NAME}/{file_path}"
-                labeled_doc = create_labeled_document(processed, doc_type, original_uri)
-                
-                if labeled_doc:
-                    # Upload labeled document
-                    output_name = file_name.replace(".pdf", ".json")
-                    output_path = f"final_labeled_documents/{doc_type}/{output_name}"
-                    
-                    if upload_labeled_document(labeled_doc, output_path):
-                        print(f"    ✅ Uploaded: {output_path}")
-                        total_processed += 1
-                    else:
-                        print(f"    ❌ Failed to upload: {output_path}")
-                else:
-                    print(f"    ❌ Failed to create labeled document")
+        pending = []
+        skipped = 0
+        for file_item in files[:5]:
+            output_path = _output_path(file_item.name, doc_type)
+            if output_path in existing:
+                labeled_paths.append(output_path)
+                skipped += 1
             else:
-                print(f"    ❌ Failed to process: {file_name}")
+                pending.append(file_item)
+        if skipped:
+            print(f"  ⏭️  Skipping {skipped} already labeled {doc_type} documents")
+        files_by_type[doc_type] = pending
     
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor, \
+            ThreadPoolExecutor(max_workers=MAX_WORKERS) as upload_executor:
+        batch_results = None
+        if USE_BATCH_OCR:
+            # One long-running operation per document type instead of one synchronous call per file
+            print("\n🔄 Batch processing documents with OCR...")
+            batch_futures = [
+                executor.submit(batch_process_documents, [f.name for f in files], doc_type)
+                for doc_type, files in files_by_type.items() if files
+            ]
+            batch_results = {}
+            for future in batch_futures:
+                batch_results.update(future.result())
+        
+        # Labeling and uploading are separate stages: as soon as a document is labeled its
+        # upload is handed off, and the OCR worker moves straight on to the next document
+        label_futures = [
+            executor.submit(_label_one, file_item, doc_type, batch_results)
+            for doc_type, files in files_by_type.items()
+            for file_item in files
+        ]
+        upload_futures = {}
+        for future in as_completed(label_futures):
+            labeled = future.result()
+            if labeled:
+                upload_futures[upload_executor.submit(_upload_one, *labeled)] = labeled[1]
+        labeled_paths.extend(upload_futures[f] for f in as_completed(upload_futures) if f.result())
+    
+    total_processed = len(labeled_paths)
     print(f"\n📊 Total documents processed and labeled: {total_processed}")
     
     if total_processed > 0:
         print("\n🔄 Starting import to Document AI processor...")
-        import_result = import_documents_to_processor()
+        # Import exactly this run's documents rather than re-scanning the whole output prefix
+        import_result = import_documents_to_processor(
+            [f"gs://{BUCKET_NAME}/{path}" for path in labeled_paths]
+        )
         
         if import_result and "name" in import_result:
             operation_name = import_result["name"]
             print(f"✅ Import operation started: {operation_name}")
             print(f"\n🎉 SUCCESS! Check your Document AI processor in the console:")
             print(f"https://console.cloud.google.com/ai/document-ai/processors/details/{CLASSIFIER_PROCESSOR_ID}?project={PROJECT_ID}")
-            print(f"\nLabeled documents location: gs://{BUCKET_NAME}/final_labeled_documents/")
+            print(f"\nLabeled documents location: gs://{BUCKET_NAME}/{LABELED_OUTPUT_PREFIX}")
             print(f"Total documents with labels: {total_processed}")
             
             print("\n✅ AUTO-LABELING COMPLETE!")
@@ -211,7 +393,13 @@ def main():
         return False
 
 if __name__ == "__main__":
-    success = main()
+    parser = argparse.ArgumentParser(description="Auto-label documents for Document AI")
+    parser.add_argument("--force", action="store_true",
+                       help="Re-process documents that already have a labeled output")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
+    
+    success = main(force=args.force)
     if success:
         print("\n🎯 MISSION ACCOMPLISHED: Auto-labeling pipeline working successfully!")
     else:
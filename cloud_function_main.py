@@ -7,8 +7,9 @@ import os
 import json
 import hashlib
 import logging
+import time
 from datetime import datetime, timezone
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Callable, Optional, Tuple
 
 from google.cloud import documentai_v1 as documentai
 from google.cloud import firestore
@@ -30,6 +31,7 @@ LOCATION = os.environ.get('DOCUMENT_AI_LOCATION', 'us')
 WORKFLOW_NAME = os.environ.get('WORKFLOW_NAME', 'automation-workflow')
 WORKFLOW_LOCATION = 'us-central1'
 BUCKET_NAME = os.environ.get('GCS_BUCKET_NAME', 'document-ai-test-veronica')
+CACHE_TTL_SECONDS = int(os.environ.get('CACHE_TTL_SECONDS', '300'))
 
 # Initialize clients
 db = firestore.Client(project=PROJECT_ID)
@@ -40,6 +42,58 @@ workflow_execution_client = executions_v1.ExecutionsClient()
 opts = ClientOptions(api_endpoint=f"{LOCATION}-documentai.googleapis.com")
 docai_client = documentai.DocumentProcessorServiceClient(client_options=opts)
 
+# Resource names are fixed per deployment; build them once per instance
+PROCESSOR_PATH = docai_client.processor_path(PROJECT_ID, LOCATION, PROCESSOR_ID)
+OCR_PROCESSOR_PATH = docai_client.processor_path(PROJECT_ID, LOCATION, OCR_PROCESSOR_ID)
+
+# Per-instance cache for rarely-changing lookups (processor state, training config).
+# Warm function instances reuse it across invocations; entries expire after CACHE_TTL_SECONDS.
+_cache: Dict[str, Tuple[float, Any]] = {}
+
+
+def _cached(key: str, ttl: float, fn: Callable[[], Any]) -> Any:
+    """Return the cached value for key, calling fn to refresh it once older than ttl seconds."""
+    now = time.monotonic()
+    hit = _cache.get(key)
+    if hit and now - hit[0] < ttl:
+        return hit[1]
+    value = fn()
+    _cache[key] = (now, value)
+    return value
+
+
+def _shared_cached(key: str, ttl: float, fn: Callable[[], Any]) -> Any:
+    """
+    Like _cached() but backed by the Firestore 'processor_cache' collection, so cold
+    instances can reuse a value fetched by another instance instead of calling fn.
+    Values must be Firestore-serializable.
+    """
+    now = time.monotonic()
+    hit = _cache.get(key)
+    if hit and now - hit[0] < ttl:
+        return hit[1]
+    
+    cache_ref = db.collection('processor_cache').document(hashlib.sha1(key.encode()).hexdigest())
+    try:
+        snapshot = cache_ref.get()
+        if snapshot.exists:
+            entry = snapshot.to_dict()
+            age = (datetime.now(timezone.utc) - entry['fetched_at']).total_seconds()
+            if age < ttl:
+                # Stamp the local entry with the shared fetch time so it expires with it
+                _cache[key] = (now - max(age, 0.0), entry['value'])
+                return entry['value']
+    except Exception as e:
+        logger.warning(f"Processor cache read failed for {key}: {str(e)}")
+    
+    value = fn()
+    _cache[key] = (now, value)
+    try:
+        cache_ref.set({'key': key, 'value': value, 'fetched_at': datetime.now(timezone.utc)})
+    except Exception as e:
+        logger.warning(f"Processor cache write failed for {key}: {str(e)}")
+    return value
+
 # Allowed document labels based on current GCS subfolders
 ALLOWED_DOCUMENT_LABELS = [
     'capital_call',
@@ -121,7 +175,7 @@ def process_document_upload(event: Dict[str, Any], context: Any) -> Dict[str, An
         }
         
         # Check if processor has a trained version
-        processor_path = f"projects/{PROJECT_ID}/locations/{LOCATION}/processors/{PROCESSOR_ID}"
+        processor_path = PROCESSOR_PATH
         has_trained_version = check_processor_versions(processor_path)
         
         if has_trained_version:
@@ -217,47 +271,80 @@ def auto_label_document(file_name: str, gcs_uri: str) -> str:
     return 'OTHER'
 
 
+def _has_deployed_version(processor_path: str) -> bool:
+    """List processor versions and report whether any is deployed."""
+    request = documentai.ListProcessorVersionsRequest(parent=processor_path, page_size=50)
+    versions = docai_client.list_processor_versions(request=request)
+    
+    # Stop at the first deployed version instead of paging through the full history
+    for version in versions:
+        if version.state == documentai.ProcessorVersion.State.DEPLOYED:
+            logger.info(f"Found deployed processor version: {version.display_name}")
+            return True
+    
+    return False
+
+
 def check_processor_versions(processor_path: str) -> bool:
     """Check if processor has any trained versions."""
     try:
-        request = documentai.ListProcessorVersionsRequest(parent=processor_path)
-        versions = docai_client.list_processor_versions(request=request)
-        
-        has_deployed = False
-        for version in versions:
-            logger.info(f"Found processor version: {version.display_name} - State: {version.state.name}")
-            if version.state == documentai.ProcessorVersion.State.DEPLOYED:
-                has_deployed = True
-        
+        cache_key = f"deployed:{processor_path}"
+        has_deployed = _cached(
+            cache_key,
+            CACHE_TTL_SECONDS,
+            lambda: _has_deployed_version(processor_path)
+        )
+        if not has_deployed:
+            # Only cache a positive answer: uploads must switch to the trained model
+            # as soon as the first version deploys, and deployed versions don't vanish
+            _cache.pop(cache_key, None)
         return has_deployed
     except Exception as e:
         logger.error(f"Error checking processor versions: {str(e)}")
         return False
 
 
-def process_with_document_ai(gcs_uri: str, processor_path: str) -> Dict[str, Any]:
-    """Process document with Document AI."""
+def process_with_document_ai(gcs_uri: str, processor_path: str, allow_gcs_ref: bool = True) -> Dict[str, Any]:
+    """
+    Process document with Document AI.
+    By default the document is passed by GCS reference so Document AI reads it
+    server-side; set allow_gcs_ref=False to send the PDF bytes inline instead.
+    """
     try:
         # Get the default processor version
-        processor = docai_client.get_processor(name=processor_path)
-        processor_name = processor.default_processor_version or processor_path
-        
-        # Read document from GCS
-        bucket_name = gcs_uri.split('/')[2]
-        blob_name = '/'.join(gcs_uri.split('/')[3:])
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(blob_name)
-        content = blob.download_as_bytes()
-        
-        # Process document
-        request = documentai.ProcessRequest(
-            name=processor_name,
-            raw_document=documentai.RawDocument(
-                content=content,
-                mime_type="application/pdf"
-            ),
-            skip_human_review=True
+        default_version = _shared_cached(
+            f"default_version:{processor_path}",
+            CACHE_TTL_SECONDS,
+            lambda: docai_client.get_processor(name=processor_path).default_processor_version
         )
+        processor_name = default_version or processor_path
+        
+        if allow_gcs_ref:
+            # Let Document AI fetch the PDF itself - no local copy of the content
+            request = documentai.ProcessRequest(
+                name=processor_name,
+                gcs_document=documentai.GcsDocument(
+                    gcs_uri=gcs_uri,
+                    mime_type="application/pdf"
+                ),
+                skip_human_review=True
+            )
+        else:
+            # Read document from GCS
+            bucket_name = gcs_uri.split('/')[2]
+            blob_name = '/'.join(gcs_uri.split('/')[3:])
+            bucket = storage_client.bucket(bucket_name)
+            blob = bucket.blob(blob_name)
+            content = blob.download_as_bytes()
+            
+            request = documentai.ProcessRequest(
+                name=processor_name,
+                raw_document=documentai.RawDocument(
+                    content=content,
+                    mime_type="application/pdf"
+                ),
+                skip_human_review=True
+            )
         
         result = docai_client.process_document(request=request)
         
@@ -302,6 +389,27 @@ def process_with_document_ai(gcs_uri: str, processor_path: str) -> Dict[str, Any
         raise
 
 
+def _load_training_config() -> Dict[str, Any]:
+    """Read the processor's training config, creating the default one if missing."""
+    config_ref = db.collection('training_configs').document(PROCESSOR_ID)
+    config_doc = config_ref.get()
+    
+    if not config_doc.exists:
+        # Create default config
+        default_config = {
+            'enabled': True,
+            'min_documents_for_initial_training': 3,
+            'min_documents_for_incremental': 2,
+            'min_accuracy_for_deployment': 0,
+            'check_interval_minutes': 60,
+            'created_at': datetime.now(timezone.utc)
+        }
+        config_ref.set(default_config)
+        return default_config
+    
+    return config_doc.to_dict()
+
+
 def check_training_conditions() -> Tuple[bool, str]:
     """
     Check if training conditions are met.
@@ -309,23 +417,7 @@ def check_training_conditions() -> Tuple[bool, str]:
     """
     try:
         # Get training configuration
-        config_ref = db.collection('training_configs').document(PROCESSOR_ID)
-        config_doc = config_ref.get()
-        
-        if not config_doc.exists:
-            # Create default config
-            default_config = {
-                'enabled': True,
-                'min_documents_for_initial_training': 3,
-                'min_documents_for_incremental': 2,
-                'min_accuracy_for_deployment': 0,
-                'check_interval_minutes': 60,
-                'created_at': datetime.now(timezone.utc)
-            }
-            config_ref.set(default_config)
-            config = default_config
-        else:
-            config = config_doc.to_dict()
+        config = _cached(f"training_config:{PROCESSOR_ID}", CACHE_TTL_SECONDS, _load_training_config)
         
         if not config.get('enabled', True):
             logger.info("Training is disabled in configuration")
@@ -358,47 +450,34 @@ def check_training_conditions() -> Tuple[bool, str]:
         # except Exception as e:
         #     logger.warning(f"Workflow trigger check failed (index building?): {str(e)}")
         
-        # Count documents by status with proper labels
-        pending_initial_query = db.collection('processed_documents').where(
-            'processor_id', '==', PROCESSOR_ID
-        ).where(
-            'status', '==', 'pending_initial_training'
+        # Two server-filtered scans, so already-used completed documents are never read.
+        # Only the label is fetched, not extracted_data and the rest of the record.
+        def count_labels(query) -> Dict[str, int]:
+            """Count labeled documents per label (unlabeled ones don't count towards training)."""
+            counts: Dict[str, int] = {}
+            for doc in query.select(['document_label']).stream():
+                label = doc.to_dict().get('document_label')
+                if label:
+                    counts[label] = counts.get(label, 0) + 1
+            return counts
+        
+        training_docs = db.collection('processed_documents').where('processor_id', '==', PROCESSOR_ID)
+        pending_labels = count_labels(training_docs.where('status', '==', 'pending_initial_training'))
+        unused_labels = count_labels(
+            training_docs.where('status', '==', 'completed').where('used_for_training', '==', False)
         )
         
-        unused_completed_query = db.collection('processed_documents').where(
-            'processor_id', '==', PROCESSOR_ID
-        ).where(
-            'status', '==', 'completed'
-        ).where(
-            'used_for_training', '==', False
-        )
-        
-        pending_initial_docs = list(pending_initial_query.get())
-        unused_completed_docs = list(unused_completed_query.get())
-        
-        # Filter out documents without labels
-        pending_initial = [doc for doc in pending_initial_docs if doc.to_dict().get('document_label')]
-        unused_completed = [doc for doc in unused_completed_docs if doc.to_dict().get('document_label')]
-        
-        pending_count = len(pending_initial)
-        unused_count = len(unused_completed)
+        pending_count = sum(pending_labels.values())
+        unused_count = sum(unused_labels.values())
         
         logger.info(f"Training check - Labeled pending initial: {pending_count}, Labeled unused completed: {unused_count}")
         
         # Check label distribution
         if pending_count > 0:
-            label_dist = {}
-            for doc in pending_initial:
-                label = doc.to_dict().get('document_label', 'OTHER')
-                label_dist[label] = label_dist.get(label, 0) + 1
-            logger.info(f"Initial training label distribution: {label_dist}")
+            logger.info(f"Initial training label distribution: {pending_labels}")
         
         if unused_count > 0:
-            label_dist = {}
-            for doc in unused_completed:
-                label = doc.to_dict().get('document_label', 'OTHER')
-                label_dist[label] = label_dist.get(label, 0) + 1
-            logger.info(f"Incremental training label distribution: {label_dist}")
+            logger.info(f"Incremental training label distribution: {unused_labels}")
         
         # Check for initial training
         min_initial = config.get('min_documents_for_initial_training', 3)
@@ -461,21 +540,16 @@ def create_labeled_document_json(doc_data: Dict[str, Any]) -> Optional[Dict]:
         
         # Process document with OCR processor for text extraction
         request = documentai.ProcessRequest(
-            name=f"projects/{PROJECT_ID}/locations/{LOCATION}/processors/{OCR_PROCESSOR_ID}",
+            name=OCR_PROCESSOR_PATH,
             gcs_document=documentai.GcsDocument(
                 gcs_uri=source_gcs_uri,
                 mime_type="application/pdf"
             )
         )
         
-        # Use OCR processor to get document text and structure
-        ocr_processor_path = f"projects/{PROJECT_ID}/locations/{LOCATION}/processors/{OCR_PROCESSOR_ID}"
-        ocr_client = documentai.DocumentProcessorServiceClient(
-            client_options=ClientOptions(api_endpoint=f"{LOCATION}-documentai.googleapis.com")
-        )
-        
+        # Use OCR processor to get document text and structure (same endpoint as the shared client)
         try:
-            result = ocr_client.process_document(request=request)
+            result = docai_client.process_document(request=request)
             
             if not result.document:
                 logger.warning("OCR processing returned no document, using filename-based labeling only")
@@ -582,6 +656,8 @@ def organize_training_documents(training_type: str) -> str:
             'document_label', '>', ''
         ).limit(50)  # Limit to prevent timeout
         
+        # Read the (limited) results up front: the loop makes slow OCR calls per document,
+        # and a Firestore stream held open that long can hit its deadline mid-run
         docs = list(query.get())
         logger.info(f"Found {len(docs)} documents to create labeled training data")
         
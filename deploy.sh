@@ -239,6 +239,37 @@ EOF
     print_status "Firestore setup completed"
 }
 
+# Create composite indexes for the cloud function's multi-field queries
+create_firestore_indexes() {
+    print_info "Creating Firestore composite indexes..."
+    
+    # organize_training_documents: equality on processor_id/status/used_for_training + range on document_label
+    if gcloud firestore indexes composite create \
+        --collection-group=processed_documents \
+        --field-config=field-path=processor_id,order=ascending \
+        --field-config=field-path=status,order=ascending \
+        --field-config=field-path=used_for_training,order=ascending \
+        --field-config=field-path=document_label,order=ascending \
+        --async --quiet 2>/dev/null; then
+        print_status "Requested index: processed_documents (processor_id, status, used_for_training, document_label)"
+    else
+        print_warning "Index on processed_documents already exists or could not be created"
+    fi
+    
+    # Recent workflow trigger check: equality on processor_id + range on triggered_at
+    if gcloud firestore indexes composite create \
+        --collection-group=workflow_triggers \
+        --field-config=field-path=processor_id,order=ascending \
+        --field-config=field-path=triggered_at,order=descending \
+        --async --quiet 2>/dev/null; then
+        print_status "Requested index: workflow_triggers (processor_id, triggered_at desc)"
+    else
+        print_warning "Index on workflow_triggers already exists or could not be created"
+    fi
+    
+    print_info "Indexes build in the background; check status with: gcloud firestore indexes composite list"
+}
+
 # Deploy Cloud Function with enhanced configuration
 deploy_cloud_function() {
     print_info "Deploying Cloud Function..."
@@ -432,6 +463,7 @@ main() {
     create_storage_bucket
     create_pubsub_topics
     setup_firestore
+    create_firestore_indexes
     deploy_cloud_function
     deploy_workflow
     create_scheduler_job
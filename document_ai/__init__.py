@@ -1,40 +1,44 @@
 """Document AI package for processing and training documents."""
 
-# Core client
-from .client import EnhancedDocumentAIClient
+import importlib
 
-# Models
-from .models import (
-    DocumentAIStatus,
-    DocumentType,
-    ProcessedDocument,
-    IncrementalTrainingBatch,
-    AutomatedTrainingConfig,
-)
+# Public name -> (submodule, attribute). Submodules pull in the Google Cloud
+# client libraries, FastAPI and Beanie, so they are imported on first access
+# instead of when the package is imported.
+_EXPORTS = {
+    # Core client
+    'EnhancedDocumentAIClient': ('.client', 'EnhancedDocumentAIClient'),
 
-# Training components
-from .incremental_training import AutomatedTrainingManager
+    # Models
+    'DocumentAIStatus': ('.models', 'DocumentAIStatus'),
+    'DocumentType': ('.models', 'DocumentType'),
+    'ProcessedDocument': ('.models', 'ProcessedDocument'),
+    'IncrementalTrainingBatch': ('.models', 'IncrementalTrainingBatch'),
+    'AutomatedTrainingConfig': ('.models', 'AutomatedTrainingConfig'),
 
-# API
-from .api import router as document_ai_router
+    # Training components
+    'AutomatedTrainingManager': ('.incremental_training', 'AutomatedTrainingManager'),
 
-__all__ = [
-    # Core client
-    'EnhancedDocumentAIClient',
-    
-    # Models
-    'DocumentAIStatus',
-    'DocumentType',
-    'ProcessedDocument',
-    'IncrementalTrainingBatch',
-    'AutomatedTrainingConfig',
-    
-    # Training
-    'AutomatedTrainingManager',
-    
     # API
-    'document_ai_router',
-]
+    'document_ai_router': ('.api', 'router'),
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    try:
+        module_name, attr = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(module_name, __name__), attr)
+    globals()[name] = value  # Cache so later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
 
 # Version
-__version__ = "2.0.0"
\ No newline at end of file
+__version__ = "2.0.0"
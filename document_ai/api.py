@@ -1,12 +1,15 @@
 """Enhanced API router for Document AI with full automation."""
 
+import asyncio
 import os
 import tempfile
+from functools import lru_cache
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timezone
 
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, Form, Query
 from fastapi.responses import JSONResponse
+from pymongo import ReturnDocument
 
 from .client import EnhancedDocumentAIClient
 from .incremental_training import IncrementalTrainingManager
@@ -27,9 +30,18 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1/document-ai", tags=["document-ai"])
 
+# Batch upload pipeline: concurrent upload/process workers and spooled files waiting for them
+BATCH_UPLOAD_WORKERS = 4
+BATCH_UPLOAD_QUEUE_SIZE = 4
 
+
+@lru_cache(maxsize=1)
 def get_client() -> EnhancedDocumentAIClient:
-    """Get Document AI client instance."""
+    """Get the shared Document AI client instance.
+
+    Built once per process so requests reuse its gRPC channel, storage and Firestore
+    clients instead of reconnecting (and re-checking the bucket) every time.
+    """
     return EnhancedDocumentAIClient()
 
 
@@ -86,7 +98,8 @@ async def upload_document(
                 file_path=tmp_file.name,
                 document_name=doc_name,
                 expected_type=expected_type,
-                process_immediately=True  # This triggers immediate processing
+                process_immediately=True,  # This triggers immediate processing
+                mime_type=file.content_type,
             )
                 
                 return response
@@ -119,31 +132,53 @@ async def upload_documents_batch(
         List of upload responses.
     """
     try:
-        results = []
+        results: List[Optional[Dict[str, Any]]] = [None] * len(files)
         
-        for file in files:
-            # Process each file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp_file:
-                content = await file.read()
-                tmp_file.write(content)
-                tmp_file.flush()
-                
+        # Producer spools uploads to temp files while consumers send earlier ones
+        # to GCS/Document AI; the bounded queue caps how many temp files exist at once.
+        queue: asyncio.Queue = asyncio.Queue(maxsize=BATCH_UPLOAD_QUEUE_SIZE)
+        
+        async def spool_files():
+            try:
+                for index, file in enumerate(files):
+                    # Read before creating the temp file so a failed read leaves nothing behind
+                    content = await file.read()
+                    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp_file:
+                        try:
+                            tmp_file.write(content)
+                        except BaseException:
+                            os.unlink(tmp_file.name)
+                            raise
+                    await queue.put((index, file, tmp_file.name))
+            finally:
+                # Always release the workers, even if reading an upload failed
+                for _ in range(BATCH_UPLOAD_WORKERS):
+                    await queue.put(None)
+        
+        async def process_files():
+            while (item := await queue.get()) is not None:
+                index, file, tmp_path = item
                 try:
                     response = await client.upload_and_process_document(
-                        document_path=tmp_file.name,
+                        document_path=tmp_path,
                         document_name=file.filename,
                         expected_type=expected_type,
                         mime_type=file.content_type,
                     )
-                    results.append(response.dict())
+                    results[index] = response.dict()
                 except Exception as e:
-                    results.append({
+                    results[index] = {
                         "filename": file.filename,
                         "status": "failed",
                         "error": str(e),
-                    })
+                    }
                 finally:
-                    os.unlink(tmp_file.name)
+                    os.unlink(tmp_path)
+        
+        await asyncio.gather(
+            spool_files(),
+            *(process_files() for _ in range(BATCH_UPLOAD_WORKERS)),
+        )
         
         return JSONResponse(content={
             "total": len(files),
@@ -205,32 +240,35 @@ async def get_training_status(processor_id: str):
         Training status response.
     """
     try:
-        # Get active training
-        active_training = await IncrementalTrainingBatch.find_one({
-            "processor_id": processor_id,
-            "status": {"$in": [DocumentAIStatus.PENDING, DocumentAIStatus.TRAINING, DocumentAIStatus.DEPLOYING]}
-        })
+        # Only ship the fields the response uses; document_ids can be large, so count it server-side
+        batch_fields = {
+            "_id": 0,
+            "batch_id": 1,
+            "status": 1,
+            "started_at": 1,
+            "completed_at": 1,
+            "deployed_at": 1,
+            "model_id": 1,
+            "accuracy_score": 1,
+            "document_count": {"$size": {"$ifNull": ["$document_ids", []]}},
+        }
         
-        # Get last completed training
-        last_training = await IncrementalTrainingBatch.find_one({
-            "processor_id": processor_id,
-            "status": {"$in": [DocumentAIStatus.DEPLOYED, DocumentAIStatus.TRAINED]}
-        }).sort([("completed_at", -1)])
-        
-        # Get deployed model
-        deployed_model = await IncrementalTrainingBatch.find_one({
-            "processor_id": processor_id,
-            "status": DocumentAIStatus.DEPLOYED
-        }).sort([("deployed_at", -1)])
+        async def latest_batch(statuses: List[DocumentAIStatus], sort_field: Optional[str] = None):
+            """Newest batch in the given statuses; $match/$sort lead the pipeline so they use the indexes."""
+            pipeline = [{"$match": {"processor_id": processor_id, "status": {"$in": statuses}}}]
+            if sort_field:
+                pipeline.append({"$sort": {sort_field: -1}})
+            pipeline += [{"$limit": 1}, {"$project": batch_fields}]
+            return next(iter(await IncrementalTrainingBatch.aggregate(pipeline).to_list()), None)
         
-        # Count pending documents
-        pending_docs = await ProcessedDocument.find({
-            "processor_id": processor_id,
-            "status": DocumentAIStatus.COMPLETED,
-            "used_for_training": False,
-        }).count()
+        # Active, last completed and deployed batches as three indexed lookups run concurrently
+        active_training, last_training, deployed_model = await asyncio.gather(
+            latest_batch([DocumentAIStatus.PENDING, DocumentAIStatus.TRAINING, DocumentAIStatus.DEPLOYING]),
+            latest_batch([DocumentAIStatus.DEPLOYED, DocumentAIStatus.TRAINED], "completed_at"),
+            latest_batch([DocumentAIStatus.DEPLOYED], "deployed_at"),
+        )
         
-        # Get document type distribution
+        # Pending count and document type distribution in one aggregation over completed documents
         pipeline = [
             {"$match": {
                 "processor_id": processor_id,
@@ -238,13 +276,16 @@ async def get_training_status(processor_id: str):
             }},
             {"$group": {
                 "_id": "$document_type",
-                "count": {"$sum": 1}
+                "count": {"$sum": 1},
+                "pending": {"$sum": {"$cond": [{"$eq": ["$used_for_training", False]}, 1, 0]}},
             }}
         ]
         
+        pending_docs = 0
         type_distribution = {}
         async for result in ProcessedDocument.aggregate(pipeline):
             type_distribution[result["_id"]] = result["count"]
+            pending_docs += result["pending"]
         
         # Get training config
         config = await AutomatedTrainingConfig.find_one({"processor_id": processor_id})
@@ -257,24 +298,24 @@ async def get_training_status(processor_id: str):
         return TrainingStatusResponse(
             processor_id=processor_id,
             active_training={
-                "batch_id": active_training.batch_id,
-                "status": active_training.status,
-                "started_at": active_training.started_at,
-                "document_count": len(active_training.document_ids),
+                "batch_id": active_training["batch_id"],
+                "status": active_training["status"],
+                "started_at": active_training.get("started_at"),
+                "document_count": active_training["document_count"],
             } if active_training else None,
             pending_documents=pending_docs,
             last_training={
-                "batch_id": last_training.batch_id,
-                "completed_at": last_training.completed_at,
-                "accuracy": last_training.accuracy_score,
-                "document_count": len(last_training.document_ids),
+                "batch_id": last_training["batch_id"],
+                "completed_at": last_training.get("completed_at"),
+                "accuracy": last_training.get("accuracy_score"),
+                "document_count": last_training["document_count"],
             } if last_training else None,
             next_training_estimate=next_training,
             deployed_model={
-                "batch_id": deployed_model.batch_id,
-                "model_id": deployed_model.model_id,
-                "deployed_at": deployed_model.deployed_at,
-                "accuracy": deployed_model.accuracy_score,
+                "batch_id": deployed_model["batch_id"],
+                "model_id": deployed_model["model_id"],
+                "deployed_at": deployed_model.get("deployed_at"),
+                "accuracy": deployed_model.get("accuracy_score"),
             } if deployed_model else None,
             document_type_distribution=type_distribution,
         )
@@ -316,9 +357,11 @@ async def list_documents(
         if used_for_training is not None:
             query["used_for_training"] = used_for_training
         
-        # Get documents
-        documents = await ProcessedDocument.find(query).skip(skip).limit(limit).to_list()
-        total = await ProcessedDocument.find(query).count()
+        # Get the page and the total count concurrently
+        documents, total = await asyncio.gather(
+            ProcessedDocument.find(query).skip(skip).limit(limit).to_list(),
+            ProcessedDocument.find(query).count(),
+        )
         
         return JSONResponse(content={
             "total": total,
@@ -367,35 +410,52 @@ async def update_training_configuration(
         Updated configuration.
     """
     try:
-        config = await AutomatedTrainingConfig.find_one({"processor_id": processor_id})
-        
-        if not config:
-            config = AutomatedTrainingConfig(processor_id=processor_id)
-        
-        # Update fields
+        # Only the supplied fields are written, in one $set instead of find + full-document save
+        updates: Dict[str, Any] = {}
         if enabled is not None:
-            config.enabled = enabled
+            updates["enabled"] = enabled
         if check_interval_minutes is not None:
-            config.check_interval_minutes = check_interval_minutes
+            updates["check_interval_minutes"] = check_interval_minutes
         if min_documents_for_training is not None:
-            config.min_documents_for_training = min_documents_for_training
+            updates["min_documents_for_training"] = min_documents_for_training
         if min_accuracy_for_deployment is not None:
-            config.min_accuracy_for_deployment = min_accuracy_for_deployment
+            updates["min_accuracy_for_deployment"] = min_accuracy_for_deployment
         if document_types is not None:
-            config.document_types = document_types
+            updates["document_types"] = [doc_type.value for doc_type in document_types]
+        updates["updated_at"] = datetime.now(timezone.utc)
         
-        config.updated_at = datetime.now(timezone.utc)
-        await config.save()
+        # Model defaults for a config that doesn't exist yet, minus the fields being set
+        defaults = AutomatedTrainingConfig(processor_id=processor_id)
+        on_insert = {
+            field: getattr(defaults, field)
+            for field in (
+                "enabled",
+                "check_interval_minutes",
+                "min_documents_for_training",
+                "min_accuracy_for_deployment",
+                "document_types",
+                "created_at",
+            )
+            if field not in updates
+        }
+        
+        # Server-side upsert: update and create-on-miss happen in a single findAndModify
+        config = await AutomatedTrainingConfig.get_motor_collection().find_one_and_update(
+            {"processor_id": processor_id},
+            {"$set": updates, "$setOnInsert": on_insert},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
         
         return JSONResponse(content={
             "message": "Configuration updated successfully",
             "config": {
-                "processor_id": config.processor_id,
-                "enabled": config.enabled,
-                "check_interval_minutes": config.check_interval_minutes,
-                "min_documents_for_training": config.min_documents_for_training,
-                "min_accuracy_for_deployment": config.min_accuracy_for_deployment,
-                "document_types": config.document_types,
+                "processor_id": config["processor_id"],
+                "enabled": config["enabled"],
+                "check_interval_minutes": config["check_interval_minutes"],
+                "min_documents_for_training": config["min_documents_for_training"],
+                "min_accuracy_for_deployment": config["min_accuracy_for_deployment"],
+                "document_types": config["document_types"],
             }
         })
         
@@ -4,8 +4,10 @@ This replaces the original client.py to work seamlessly with GCS triggers.
 """
 
 import asyncio
+import mimetypes
 import os
 import logging
+import time
 import uuid
 from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timezone
@@ -14,7 +16,7 @@ from pathlib import Path
 from google.cloud import documentai_v1 as documentai
 from google.cloud import storage
 from google.cloud import firestore
-from google.api_core import retry
+from google.api_core import exceptions, retry
 from google.api_core.client_options import ClientOptions
 
 from .models import (
@@ -26,6 +28,21 @@ from .models import (
 
 logger = logging.getLogger(__name__)
 
+# Processor state shared by client instances in this process, keyed by processor path.
+# Long-lived clients re-check it through this cache, so a newly deployed version is
+# picked up within the TTL without re-fetching the processor on every request.
+PROCESSOR_STATE_TTL_SECONDS = float(os.getenv("PROCESSOR_STATE_TTL_SECONDS", "30"))
+_processor_state_cache: Dict[str, Tuple[float, Tuple[Any, Any, str, bool]]] = {}
+
+# Back off exponentially on quota/availability errors instead of pacing requests with fixed sleeps
+_QUOTA_RETRY = retry.Retry(
+    predicate=retry.if_exception_type(exceptions.ResourceExhausted, exceptions.ServiceUnavailable),
+    initial=1.0,
+    multiplier=2.0,
+    maximum=30.0,
+    timeout=300.0,
+)
+
 
 class EnhancedDocumentAIClient:
     """
@@ -110,6 +127,16 @@ class EnhancedDocumentAIClient:
 
     def _check_processor_state(self):
         """Check processor state and available versions."""
+        cached = _processor_state_cache.get(self.processor_path)
+        if cached and time.monotonic() - cached[0] < PROCESSOR_STATE_TTL_SECONDS:
+            (
+                self.processor_state,
+                self.processor_type,
+                self.default_version,
+                self.has_deployed_version,
+            ) = cached[1]
+            return
+        
         try:
             processor = self.client.get_processor(name=self.processor_path)
             self.processor_state = processor.state
@@ -119,9 +146,10 @@ class EnhancedDocumentAIClient:
             self.default_version = processor.default_processor_version
             
             # List versions
-            request = documentai.ListProcessorVersionsRequest(parent=self.processor_path)
-            versions = list(self.client.list_processor_versions(request=request))
+            request = documentai.ListProcessorVersionsRequest(parent=self.processor_path, page_size=50)
+            versions = self.client.list_processor_versions(request=request)
             
+            # Iterate the pager lazily so later pages are only fetched if nothing is deployed yet
             self.has_deployed_version = any(
                 v.state == documentai.ProcessorVersion.State.DEPLOYED for v in versions
             )
@@ -129,6 +157,13 @@ class EnhancedDocumentAIClient:
             logger.info(f"Processor state: {self.processor_state.name}")
             logger.info(f"Has deployed version: {self.has_deployed_version}")
             
+            _processor_state_cache[self.processor_path] = (time.monotonic(), (
+                self.processor_state,
+                self.processor_type,
+                self.default_version,
+                self.has_deployed_version,
+            ))
+            
         except Exception as e:
             logger.error(f"Error checking processor state: {str(e)}")
             self.has_deployed_version = False
@@ -141,6 +176,7 @@ class EnhancedDocumentAIClient:
         document_name: Optional[str] = None,
         expected_type: Optional[DocumentType] = None,
         process_immediately: bool = False,
+        mime_type: Optional[str] = None,
     ) -> DocumentUploadResponse:
         """
         Upload a document to GCS for automated training pipeline.
@@ -153,6 +189,7 @@ class EnhancedDocumentAIClient:
             document_name: Optional custom name for the document
             expected_type: Optional expected document type
             process_immediately: If True, process immediately instead of waiting for GCS trigger
+            mime_type: Content type to store the object with (guessed from file_path if omitted)
             
         Returns:
             DocumentUploadResponse with upload details
@@ -177,17 +214,23 @@ class EnhancedDocumentAIClient:
             }
             blob.metadata = metadata
             
-            # Upload file
-            blob.upload_from_filename(file_path)
+            # Upload file (blocking HTTP upload, keep it off the event loop)
+            # Keep the real type: the Cloud Function only picks up application/pdf uploads
+            content_type = mime_type or mimetypes.guess_type(file_path)[0]
+            await asyncio.to_thread(
+                blob.upload_from_filename, file_path, content_type=content_type
+            )
             gcs_uri = f"gs://{self.gcs_bucket}/{blob_name}"
             
             logger.info(f"Uploaded document to GCS: {gcs_uri}")
             
             # If process_immediately is True, we can trigger processing
             # Otherwise, let the Cloud Function handle it
+            if process_immediately:
+                await asyncio.to_thread(self._check_processor_state)
             if process_immediately and self.has_deployed_version:
                 return await self._process_document_immediately(
-                    gcs_uri, document_id, document_name, expected_type
+                    gcs_uri, document_id, document_name, expected_type, content_type
                 )
             
             # For automated pipeline, just return upload confirmation
@@ -225,7 +268,8 @@ class EnhancedDocumentAIClient:
             file_path=document_path,
             document_name=document_name,
             expected_type=expected_type,
-            process_immediately=True
+            process_immediately=True,
+            mime_type=mime_type,
         )
 
     async def _process_document_immediately(
@@ -234,22 +278,16 @@ class EnhancedDocumentAIClient:
         document_id: str,
         document_name: str,
         expected_type: Optional[DocumentType],
+        mime_type: Optional[str] = None,
     ) -> DocumentUploadResponse:
         """Process a document immediately using Document AI."""
         try:
-            # Read document from GCS
-            bucket_name = gcs_uri.split('/')[2]
-            blob_name = '/'.join(gcs_uri.split('/')[3:])
-            bucket = self.storage_client.bucket(bucket_name)
-            blob = bucket.blob(blob_name)
-            content = blob.download_as_bytes()
-            
-            # Process with Document AI
+            # Let Document AI read the just-uploaded object itself instead of downloading it again
             request = documentai.ProcessRequest(
                 name=self.default_version or self.processor_path,
-                raw_document=documentai.RawDocument(
-                    content=content,
-                    mime_type="application/pdf"
+                gcs_document=documentai.GcsDocument(
+                    gcs_uri=gcs_uri,
+                    mime_type=mime_type or "application/pdf"
                 ),
                 skip_human_review=True,
             )
@@ -257,6 +295,7 @@ class EnhancedDocumentAIClient:
             result = await asyncio.to_thread(
                 self.client.process_document,
                 request=request,
+                retry=_QUOTA_RETRY,
             )
             
             # Extract results
@@ -266,7 +305,7 @@ class EnhancedDocumentAIClient:
             # Save to Firestore if enabled
             if self.use_firestore:
                 doc_ref = self.firestore_client.collection('processed_documents').document(document_id)
-                doc_ref.set({
+                await asyncio.to_thread(doc_ref.set, {
                     'document_id': document_id,
                     'gcs_uri': gcs_uri,
                     'document_name': document_name,
@@ -275,6 +314,7 @@ class EnhancedDocumentAIClient:
                     'confidence_score': confidence,
                     'status': 'completed',
                     'extracted_data': extracted_data,
+                    'created_at': firestore.SERVER_TIMESTAMP,
                     'processed_at': firestore.SERVER_TIMESTAMP,
                     'used_for_training': False,
                 })
@@ -399,39 +439,49 @@ class EnhancedDocumentAIClient:
         
         try:
             # Get pending documents
-            pending_docs = self.firestore_client.collection('processed_documents').where(
+            pending_query = self.firestore_client.collection('processed_documents').where(
                 'processor_id', '==', self.processor_id
             ).where(
                 'status', 'in', ['pending', 'pending_initial_training']
-            ).get()
+            )
             
             # Get unused completed documents
-            unused_docs = self.firestore_client.collection('processed_documents').where(
+            unused_query = self.firestore_client.collection('processed_documents').where(
                 'processor_id', '==', self.processor_id
             ).where(
                 'status', '==', 'completed'
             ).where(
                 'used_for_training', '==', False
-            ).get()
+            )
             
             # Get active training
-            active_training = self.firestore_client.collection('training_batches').where(
+            active_query = self.firestore_client.collection('training_batches').where(
                 'processor_id', '==', self.processor_id
             ).where(
                 'status', 'in', ['preparing', 'training', 'deploying']
-            ).limit(1).get()
+            ).limit(1)
             
             # Get config
-            config = self.firestore_client.collection('training_configs').document(
+            config_ref = self.firestore_client.collection('training_configs').document(
                 self.processor_id
-            ).get()
+            )
+            
+            # The Firestore client is synchronous; run the independent reads concurrently
+            # Counts use server-side COUNT() aggregations instead of downloading the documents
+            pending_count, unused_count, active_training, config, _ = await asyncio.gather(
+                asyncio.to_thread(lambda: pending_query.count().get()[0][0].value),
+                asyncio.to_thread(lambda: unused_query.count().get()[0][0].value),
+                asyncio.to_thread(active_query.get),
+                asyncio.to_thread(config_ref.get),
+                asyncio.to_thread(self._check_processor_state),  # Refreshes has_deployed_version
+            )
             
             config_data = config.to_dict() if config.exists else {}
             
             return {
                 'has_model': self.has_deployed_version,
-                'pending_documents': len(pending_docs),
-                'available_for_training': len(unused_docs),
+                'pending_documents': pending_count,
+                'available_for_training': unused_count,
                 'active_training': active_training[0].to_dict() if active_training else None,
                 'next_training_threshold': config_data.get('min_documents_for_incremental', 5),
                 'auto_training_enabled': config_data.get('enabled', True),
@@ -473,6 +523,7 @@ async def upload_documents_batch(
     document_paths: List[str],
     processor_id: Optional[str] = None,
     document_types: Optional[List[DocumentType]] = None,
+    max_concurrency: int = 8,
 ) -> List[DocumentUploadResponse]:
     """
     Upload multiple documents to the automated training pipeline.
@@ -481,25 +532,25 @@ async def upload_documents_batch(
         document_paths: List of local file paths
         processor_id: Optional processor ID (uses env var if not provided)
         document_types: Optional list of expected types for each document
+        max_concurrency: Maximum number of uploads in flight at once
         
     Returns:
-        List of upload responses
+        List of upload responses, in the same order as document_paths
     """
     client = EnhancedDocumentAIClient(processor_id=processor_id)
     
-    responses = []
-    for i, path in enumerate(document_paths):
+    # The semaphore bounds the load on GCS instead of a fixed delay between files
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def upload_one(i: int, path: str) -> DocumentUploadResponse:
         expected_type = document_types[i] if document_types and i < len(document_types) else None
-        response = await client.upload_document_for_training(
-            file_path=path,
-            expected_type=expected_type,
-        )
-        responses.append(response)
-        
-        # Small delay to avoid overwhelming the system
-        await asyncio.sleep(0.5)
+        async with semaphore:
+            return await client.upload_document_for_training(
+                file_path=path,
+                expected_type=expected_type,
+            )
     
-    return responses
+    return await asyncio.gather(*(upload_one(i, path) for i, path in enumerate(document_paths)))
 
 
 async def check_automated_training_status(processor_id: Optional[str] = None) -> Dict[str, Any]:
@@ -6,6 +6,7 @@ This replaces the manual incremental_training.py with a fully automated version.
 import asyncio
 import json
 import logging
+import weakref
 from datetime import datetime, timezone, timedelta
 from typing import List, Dict, Optional, Any
 from collections import defaultdict
@@ -27,6 +28,9 @@ from .models import (
 
 logger = logging.getLogger(__name__)
 
+# Aware lower bound for "latest timestamp" scans (Firestore returns UTC-aware datetimes)
+_MIN_UTC = datetime.min.replace(tzinfo=timezone.utc)
+
 
 class AutomatedTrainingManager:
     """
@@ -54,9 +58,9 @@ class AutomatedTrainingManager:
         if use_firestore:
             self.firestore_client = firestore.Client(project=project_id)
         
-        # Document AI client
-        opts = ClientOptions(api_endpoint=f"{location}-documentai.googleapis.com")
-        self.docai_client = documentai.DocumentProcessorServiceClient(client_options=opts)
+        # Document AI client (async; one per event loop, since its channel is bound to the loop it was created on)
+        self._docai_client_options = ClientOptions(api_endpoint=f"{location}-documentai.googleapis.com")
+        self._docai_clients = weakref.WeakKeyDictionary()  # event loop -> async client
         
         # Processor path
         self.processor_path = f"projects/{project_id}/locations/{location}/processors/{processor_id}"
@@ -65,6 +69,21 @@ class AutomatedTrainingManager:
         self.training_topic = f"projects/{project_id}/topics/document-ai-training"
         self.notification_topic = f"projects/{project_id}/topics/document-ai-notifications"
 
+    @property
+    def docai_client(self) -> documentai.DocumentProcessorServiceAsyncClient:
+        """Native asyncio Document AI client for the running loop, so RPCs don't tie up a worker thread.
+
+        Managers are often reused across asyncio.run() calls, so a client is kept per loop.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._docai_clients.get(loop)
+        if client is None:
+            client = documentai.DocumentProcessorServiceAsyncClient(
+                client_options=self._docai_client_options
+            )
+            self._docai_clients[loop] = client
+        return client
+
     async def setup_automated_pipeline(self, bucket_name: str):
         """
         Set up the complete automated pipeline including:
@@ -93,7 +112,9 @@ class AutomatedTrainingManager:
         try:
             # Create training topic
             try:
-                self.pubsub_publisher.create_topic(request={"name": self.training_topic})
+                await asyncio.to_thread(
+                    self.pubsub_publisher.create_topic, request={"name": self.training_topic}
+                )
                 logger.info(f"Created Pub/Sub topic: {self.training_topic}")
             except Exception as e:
                 if "already exists" in str(e):
@@ -103,7 +124,9 @@ class AutomatedTrainingManager:
             
             # Create notification topic
             try:
-                self.pubsub_publisher.create_topic(request={"name": self.notification_topic})
+                await asyncio.to_thread(
+                    self.pubsub_publisher.create_topic, request={"name": self.notification_topic}
+                )
                 logger.info(f"Created Pub/Sub topic: {self.notification_topic}")
             except Exception as e:
                 if "already exists" in str(e):
@@ -132,14 +155,14 @@ class AutomatedTrainingManager:
             )
             
             # Check if notification already exists
-            existing_notifications = bucket.list_notifications()
+            existing_notifications = await asyncio.to_thread(lambda: list(bucket.list_notifications()))
             for existing in existing_notifications:
                 if existing.topic_name == self.training_topic:
                     logger.info("GCS notification already exists")
                     return
             
             # Create the notification
-            notification.create()
+            await asyncio.to_thread(notification.create)
             logger.info(f"Created GCS notification for bucket {bucket_name}")
             
         except Exception as e:
@@ -150,18 +173,17 @@ class AutomatedTrainingManager:
         """Initialize processor with base configuration if needed."""
         try:
             # Check if processor exists and has versions
-            processor = self.docai_client.get_processor(name=self.processor_path)
+            processor = await self.docai_client.get_processor(name=self.processor_path)
             
             # List processor versions
             versions_request = documentai.ListProcessorVersionsRequest(
                 parent=self.processor_path
             )
-            versions = self.docai_client.list_processor_versions(request=versions_request)
-            
-            has_deployed_version = any(
-                v.state == documentai.ProcessorVersion.State.DEPLOYED 
-                for v in versions
-            )
+            has_deployed_version = False
+            async for v in await self.docai_client.list_processor_versions(request=versions_request):
+                if v.state == documentai.ProcessorVersion.State.DEPLOYED:
+                    has_deployed_version = True
+                    break
             
             if not has_deployed_version:
                 logger.info("No deployed processor version found - processor ready for initial training")
@@ -178,11 +200,14 @@ class AutomatedTrainingManager:
         Process a batch of documents for training.
         This is called by the Cloud Workflow.
         """
+        # One clock read per execution so the model name and notifications agree
+        now = datetime.now(timezone.utc)
+        now_iso = now.isoformat()
         try:
             logger.info(f"Processing training batch {batch_id} with {len(training_documents)} documents")
             
             # Prepare training request
-            model_display_name = f"auto-train-{batch_id}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+            model_display_name = f"auto-train-{batch_id}-{now.strftime('%Y%m%d-%H%M%S')}"
             
             processor_version = documentai.ProcessorVersion(
                 display_name=model_display_name,
@@ -215,10 +240,7 @@ class AutomatedTrainingManager:
             )
             
             # Start training
-            operation = await asyncio.to_thread(
-                self.docai_client.train_processor_version,
-                request=request
-            )
+            operation = await self.docai_client.train_processor_version(request=request)
             
             logger.info(f"Started training operation: {operation.name}")
             
@@ -228,7 +250,7 @@ class AutomatedTrainingManager:
                 'batch_id': batch_id,
                 'operation_name': operation.name,
                 'document_count': len(training_documents),
-                'timestamp': datetime.now(timezone.utc).isoformat()
+                'timestamp': now_iso
             })
             
             return operation.name
@@ -239,7 +261,7 @@ class AutomatedTrainingManager:
                 'event': 'training_failed',
                 'batch_id': batch_id,
                 'error': str(e),
-                'timestamp': datetime.now(timezone.utc).isoformat()
+                'timestamp': now_iso
             })
             raise
 
@@ -249,12 +271,9 @@ class AutomatedTrainingManager:
             request = documentai.ListProcessorVersionsRequest(
                 parent=self.processor_path
             )
-            versions = self.docai_client.list_processor_versions(request=request)
-            
-            for version in versions:
+            async for version in await self.docai_client.list_processor_versions(request=request):
                 if version.state == documentai.ProcessorVersion.State.DEPLOYED:
                     return version.name
-            
             return None
             
         except Exception as e:
@@ -291,10 +310,7 @@ class AutomatedTrainingManager:
         while True:
             try:
                 # Check operation status
-                operation = await asyncio.to_thread(
-                    self.docai_client._transport.operations_client.get_operation,
-                    name=operation_name
-                )
+                operation = await self.docai_client.get_operation(request={"name": operation_name})
                 
                 if operation.done:
                     if operation.error:
@@ -347,21 +363,15 @@ class AutomatedTrainingManager:
                 name=processor_version_name
             )
             
-            operation = await asyncio.to_thread(
-                self.docai_client.deploy_processor_version,
-                request=request
-            )
+            operation = await self.docai_client.deploy_processor_version(request=request)
             
             logger.info(f"Started deployment operation: {operation.name}")
             
-            # Wait for deployment to complete (simplified for this example)
-            await asyncio.sleep(300)  # 5 minutes
+            # Wait for the deployment operation itself rather than a fixed delay
+            await operation.result(timeout=1800)
             
             # Set as default version
-            processor = await asyncio.to_thread(
-                self.docai_client.get_processor,
-                name=self.processor_path
-            )
+            processor = await self.docai_client.get_processor(name=self.processor_path)
             
             processor.default_processor_version = processor_version_name
             
@@ -370,10 +380,7 @@ class AutomatedTrainingManager:
                 update_mask={"paths": ["default_processor_version"]}
             )
             
-            await asyncio.to_thread(
-                self.docai_client.update_processor,
-                request=update_request
-            )
+            await self.docai_client.update_processor(request=update_request)
             
             logger.info(f"Successfully deployed and set default version: {processor_version_name}")
             return True
@@ -390,25 +397,32 @@ class AutomatedTrainingManager:
         try:
             # Get training batches
             batches_ref = self.firestore_client.collection('training_batches')
-            batches = batches_ref.where('processor_id', '==', self.processor_id).get()
-            
-            # Calculate statistics
-            total_batches = len(batches)
-            successful_batches = sum(1 for b in batches if b.to_dict().get('status') == 'deployed')
-            total_documents_trained = sum(
-                b.to_dict().get('document_count', 0) for b in batches
+            query = batches_ref.where('processor_id', '==', self.processor_id)
+            
+            # Calculate statistics in a single pass over the stream (one decode per batch, no list kept)
+            def aggregate():
+                total = successful = documents = 0
+                latest, latest_started = None, _MIN_UTC
+                for snapshot in query.stream():
+                    b = snapshot.to_dict()
+                    total += 1
+                    documents += b.get('document_count', 0)
+                    if b.get('status') == 'deployed':
+                        successful += 1
+                    started_at = b.get('started_at')
+                    if started_at and started_at > latest_started:
+                        latest, latest_started = b, started_at
+                return total, successful, documents, latest
+            
+            total_batches, successful_batches, total_documents_trained, latest_batch = (
+                await asyncio.to_thread(aggregate)
             )
-            
-            # Get latest batch
-            latest_batch = None
-            if batches:
-                latest_batch = max(batches, key=lambda b: b.to_dict().get('started_at', datetime.min))
                 
             return {
                 'total_training_batches': total_batches,
                 'successful_deployments': successful_batches,
                 'total_documents_trained': total_documents_trained,
-                'latest_batch': latest_batch.to_dict() if latest_batch else None,
+                'latest_batch': latest_batch,
                 'success_rate': (successful_batches / total_batches * 100) if total_batches > 0 else 0
             }
             
@@ -88,6 +88,8 @@ class ProcessedDocument(Document):
             "status",
             "created_at",
             "used_for_training",
+            # Status endpoint and document listing filter on these together
+            IndexModel([("processor_id", 1), ("status", 1), ("used_for_training", 1)]),
         ]
 
 
@@ -134,6 +136,10 @@ class IncrementalTrainingBatch(Document):
             "processor_id",
             "status",
             "started_at",
+            # Per-processor status lookups, newest completed/deployed first, and history
+            IndexModel([("processor_id", 1), ("status", 1), ("completed_at", -1)]),
+            IndexModel([("processor_id", 1), ("status", 1), ("deployed_at", -1)]),
+            IndexModel([("processor_id", 1), ("started_at", -1)]),
         ]
 
 
@@ -6,6 +6,7 @@ Eliminates repeated code across pipeline scripts
 
 import json
 import requests
+import threading
 import time
 from google.auth import default
 from google.auth.transport.requests import Request
@@ -18,11 +19,29 @@ CLASSIFIER_PROCESSOR_ID = "ddc065df69bfa3b5"
 LOCATION = "us"
 BUCKET_NAME = "document-ai-test-veronica"
 
+_CREDENTIALS = None
+_CREDENTIALS_LOCK = threading.Lock()
+
+_BUCKET = None
+_BUCKET_LOCK = threading.Lock()
+
 def get_access_token():
-    """Get Google Cloud access token - single implementation"""
-    credentials, _ = default()
-    credentials.refresh(Request())
-    return credentials.token
+    """Get Google Cloud access token - single implementation, refreshed only when expired"""
+    global _CREDENTIALS
+    with _CREDENTIALS_LOCK:
+        if _CREDENTIALS is None:
+            _CREDENTIALS, _ = default()
+        if not _CREDENTIALS.valid:
+            _CREDENTIALS.refresh(Request())
+        return _CREDENTIALS.token
+
+def get_bucket():
+    """Get the shared GCS bucket handle - the storage client is created once and reused"""
+    global _BUCKET
+    with _BUCKET_LOCK:
+        if _BUCKET is None:
+            _BUCKET = storage.Client(project=PROJECT_ID).bucket(BUCKET_NAME)
+        return _BUCKET
 
 def process_document_with_ocr(file_path):
     """Process document with OCR processor - unified implementation"""
@@ -82,9 +101,7 @@ def create_labeled_document(processed_doc, document_type, original_uri):
 def upload_json_to_gcs(json_data, gcs_path):
     """Upload JSON to GCS - unified implementation"""
     try:
-        client = storage.Client(project=PROJECT_ID)
-        bucket = client.bucket(BUCKET_NAME)
-        blob = bucket.blob(gcs_path)
+        blob = get_bucket().blob(gcs_path)
         blob.upload_from_string(json.dumps(json_data), content_type="application/json")
         return True
     except Exception as e:
@@ -147,19 +164,33 @@ def start_training(display_name=None):
         print(f"Error starting training: {response.text}")
         return None
 
-def monitor_operation(operation_name, operation_type="operation", max_checks=30):
-    """Monitor operation - unified implementation"""
-    access_token = get_access_token()
+def monitor_operation(operation_name, operation_type="operation", max_checks=None, poll_interval=30, max_interval=300, max_wait=None):
+    """Monitor operation - unified implementation
+    
+    Polling backs off (doubling up to max_interval seconds) while the operation's
+    metadata is unchanged, and drops back to poll_interval as soon as it moves.
+    Gives up after max_wait seconds in total, however the polls were spaced.
+    max_checks is kept for existing callers and means max_checks * poll_interval
+    seconds; with neither given the limit is 15 minutes.
+    """
+    if max_wait is None:
+        max_wait = (max_checks if max_checks is not None else 30) * poll_interval
     url = f"https://us-documentai.googleapis.com/v1beta3/{operation_name}"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "X-Goog-User-Project": PROJECT_ID
-    }
     
     print(f"🔄 Monitoring {operation_type}...")
     
-    for check in range(max_checks):
+    deadline = time.monotonic() + max_wait
+    interval = poll_interval
+    last_metadata = None
+    check = 0
+    while True:
+        check += 1
         try:
+            # Fetched per poll: cached until expiry, so long waits pick up a refreshed token
+            headers = {
+                "Authorization": f"Bearer {get_access_token()}",
+                "X-Goog-User-Project": PROJECT_ID
+            }
             response = requests.get(url, headers=headers)
             if response.status_code == 200:
                 operation = response.json()
@@ -175,14 +206,18 @@ def monitor_operation(operation_name, operation_type="operation", max_checks=30)
                     metadata = operation.get("metadata", {})
                     common_metadata = metadata.get("commonMetadata", {})
                     state = common_metadata.get("state", "RUNNING")
-                    print(f"📊 {operation_type.title()} state: {state} (check {check+1}/{max_checks})")
-                    time.sleep(30)
+                    print(f"📊 {operation_type.title()} state: {state} (check {check})")
+                    interval = min(interval * 2, max_interval) if metadata == last_metadata else poll_interval
+                    last_metadata = metadata
             else:
                 print(f"Error checking {operation_type}: {response.status_code}")
-                time.sleep(30)
         except Exception as e:
             print(f"Exception monitoring {operation_type}: {e}")
-            time.sleep(30)
+        
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        time.sleep(min(interval, remaining))
     
     print(f"⏰ {operation_type.title()} monitoring timed out")
-    return False
\ No newline at end of file
+    return False
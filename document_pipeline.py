@@ -7,6 +7,8 @@ Based on analysis of working operations, this combines the proven approaches
 that actually generated successful Google Cloud operations.
 """
 
+import base64
+import hashlib
 import json
 import requests
 import time
@@ -34,6 +36,10 @@ class DocumentAIPipeline:
         print(f"Classifier Processor: {CLASSIFIER_PROCESSOR_ID}")
         print(f"Bucket: {BUCKET_NAME}")
         print()
+        
+        # One storage client/bucket handle for every phase (credential lookup and HTTP session setup happen once)
+        self.storage_client = storage.Client(project=PROJECT_ID)
+        self.bucket = self.storage_client.bucket(BUCKET_NAME)
 
     def get_access_token(self):
         """Get Google Cloud access token"""
@@ -54,9 +60,12 @@ class DocumentAIPipeline:
             print(f"❌ Local folder does not exist: {local_folder}")
             return False
         
-        client = storage.Client(project=PROJECT_ID)
-        bucket = client.bucket(BUCKET_NAME)
+        bucket = self.bucket
         uploaded_count = 0
+        skipped_count = 0
+        
+        # One listing of what's already in GCS so unchanged files aren't re-uploaded on re-runs
+        existing_md5 = {blob.name: blob.md5_hash for blob in bucket.list_blobs(prefix="documents/")}
         
         for subfolder in local_path.iterdir():
             if subfolder.is_dir():
@@ -65,36 +74,47 @@ class DocumentAIPipeline:
                 
                 for pdf_file in subfolder.glob("*.pdf"):
                     gcs_path = f"documents/{doc_type}/{pdf_file.name}"
+                    if gcs_path in existing_md5 and existing_md5[gcs_path] == self._local_md5(pdf_file):
+                        print(f"    ⏭️  Unchanged: {pdf_file.name}")
+                        skipped_count += 1
+                        continue
                     blob = bucket.blob(gcs_path)
-                    blob.upload_from_filename(str(pdf_file))
+                    blob.upload_from_filename(str(pdf_file), content_type="application/pdf")
                     print(f"    ✅ Uploaded: {pdf_file.name}")
                     uploaded_count += 1
         
-        print(f"📊 Total documents uploaded: {uploaded_count}")
-        return uploaded_count > 0
+        print(f"📊 Total documents uploaded: {uploaded_count} (skipped {skipped_count} unchanged)")
+        return uploaded_count + skipped_count > 0
+
+    @staticmethod
+    def _local_md5(path):
+        """Base64 MD5 of a local file, in the same format as Blob.md5_hash"""
+        digest = hashlib.md5()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return base64.b64encode(digest.digest()).decode("ascii")
 
     def process_and_label_documents(self):
         """Process documents with OCR and create labeled JSON files"""
         print("\n🔄 PHASE 2: Processing and labeling documents...")
         
         # Get document types from GCS structure
-        client = storage.Client(project=PROJECT_ID)
-        bucket = client.bucket(BUCKET_NAME)
+        bucket = self.bucket
         
-        doc_types = set()
+        # One listing, grouped by type folder, instead of re-listing each folder
+        pdfs_by_type = {}
         for blob in bucket.list_blobs(prefix="documents/"):
             if blob.name.endswith(".pdf"):
                 parts = blob.name.split("/")
-                if len(parts) >= 2:
-                    doc_types.add(parts[1])
+                if len(parts) >= 3:
+                    pdfs_by_type.setdefault(parts[1], []).append(blob)
         
-        print(f"📁 Found document types: {list(doc_types)}")
+        print(f"📁 Found document types: {list(pdfs_by_type)}")
         total_processed = 0
         
-        for doc_type in doc_types:
+        for doc_type, pdfs in pdfs_by_type.items():
             print(f"\n  📁 Processing {doc_type} documents...")
-            pdfs = list(bucket.list_blobs(prefix=f"documents/{doc_type}/"))
-            pdfs = [blob for blob in pdfs if blob.name.endswith(".pdf")]
             
             for blob in pdfs:
                 file_name = blob.name.split("/")[-1]
@@ -170,9 +190,7 @@ class DocumentAIPipeline:
     def _upload_json_to_gcs(self, json_data, gcs_path):
         """Upload JSON data to GCS"""
         try:
-            client = storage.Client(project=PROJECT_ID)
-            bucket = client.bucket(BUCKET_NAME)
-            blob = bucket.blob(gcs_path)
+            blob = self.bucket.blob(gcs_path)
             blob.upload_from_string(json.dumps(json_data), content_type="application/json")
             return True
         except Exception as e:
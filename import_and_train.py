@@ -4,6 +4,8 @@ Import the documents that we know worked and train
 """
 
 import json
+import logging
+import os
 import requests
 import time
 from google.auth import default
@@ -15,6 +17,8 @@ CLASSIFIER_PROCESSOR_ID = "ddc065df69bfa3b5"
 LOCATION = "us"
 BUCKET_NAME = "document-ai-test-veronica"
 
+logger = logging.getLogger(__name__)
+
 def get_access_token():
     credentials, _ = default()
     credentials.refresh(Request())
@@ -45,11 +49,13 @@ def import_working_documents():
         ]
     }
     
+    logger.debug("importDocuments request: %s", data)
     response = requests.post(url, headers=headers, json=data)
+    logger.debug("importDocuments response: %s", response.text)
     if response.status_code == 200:
         return response.json()
     else:
-        print(f"Error importing documents: {response.text}")
+        logger.error("Error importing documents: %s", response.text)
         return None
 
 def start_training():
@@ -68,11 +74,13 @@ def start_training():
         }
     }
     
+    logger.debug("train request: %s", data)
     response = requests.post(url, headers=headers, json=data)
+    logger.debug("train response: %s", response.text)
     if response.status_code == 200:
         return response.json()
     else:
-        print(f"Error starting training: {response.text}")
+        logger.error("Error starting training: %s", response.text)
         return None
 
 def monitor_operation(operation_name, operation_type="import"):
@@ -108,7 +116,7 @@ def monitor_operation(operation_name, operation_type="import"):
                     print(f"📊 {operation_type.title()} state: {state} (check {check+1}/{max_checks})")
                     time.sleep(30)
             else:
-                print(f"Error checking {operation_type} status: {response.text}")
+                logger.error("Error checking %s status: %s", operation_type, response.text)
                 time.sleep(30)
                 
         except Exception as e:
@@ -177,6 +185,7 @@ def main():
         return True
 
 if __name__ == "__main__":
+    logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
     success = main()
     if success:
         print("\n🏆 SUCCESS: Auto-labeling and training process completed!")
@@ -8,28 +8,46 @@ from datetime import datetime, timezone
 
 PROJECT_ID = "tetrix-462721"
 PROCESSOR_ID = "ddc065df69bfa3b5"
+BATCH_WRITE_LIMIT = 400
 
 def update_training_status():
     """Update training status to completed"""
     db = firestore.Client(project=PROJECT_ID)
     
-    # Find active training records
+    # Find active training records (references only - no fields are needed to update them)
     active_training = db.collection('training_batches').where(
         'processor_id', '==', PROCESSOR_ID
     ).where(
         'status', 'in', ['pending', 'preparing', 'training', 'deploying']
-    ).get()
+    ).select([]).stream()
     
-    print(f"Found {len(active_training)} active training records")
+    # Commit in chunks instead of one RPC per document (Firestore caps a batch at 500 writes)
+    completed_at = datetime.now(timezone.utc)
+    batch = db.batch()
+    batch_ids = []
+    updated = 0
+    
+    def commit():
+        batch.commit()
+        # Only report records once their write has actually been committed
+        for doc_id in batch_ids:
+            print(f"Updated training batch {doc_id} to completed status")
     
     for doc in active_training:
-        doc_ref = db.collection('training_batches').document(doc.id)
-        doc_ref.update({
+        batch.update(doc.reference, {
             'status': 'completed',
-            'completed_at': datetime.now(timezone.utc)
+            'completed_at': completed_at
         })
-        print(f"Updated training batch {doc.id} to completed status")
+        batch_ids.append(doc.id)
+        updated += 1
+        if len(batch_ids) == BATCH_WRITE_LIMIT:
+            commit()
+            batch = db.batch()
+            batch_ids = []
+    if batch_ids:
+        commit()
     
+    print(f"Found {updated} active training records")
     print("All training records updated successfully")
 
 if __name__ == "__main__":
@@ -59,8 +59,10 @@ REQUIRED_APIS=(
     "firestore.googleapis.com"
 )
 
+# One listing of enabled services, checked locally for each API
+ENABLED_APIS=$(gcloud services list --enabled --format="value(config.name)")
 for api in "${REQUIRED_APIS[@]}"; do
-    if gcloud services list --enabled --filter="name:$api" --format="value(name)" | grep -q "$api"; then
+    if grep -qx "$api" <<< "$ENABLED_APIS"; then
         check_status "$api" "ok"
     else
         check_status "$api" "error" "API not enabled. Run: gcloud services enable $api"
@@ -69,10 +71,11 @@ done
 
 # 2. Check Cloud Function
 echo -e "\n${BLUE}2. Checking Cloud Function...${NC}"
-if gcloud functions describe $FUNCTION_NAME --region=$FUNCTION_REGION &> /dev/null; then
+# Describe once and read every field from the same snapshot
+if FUNCTION_JSON=$(gcloud functions describe $FUNCTION_NAME --region=$FUNCTION_REGION --format=json 2> /dev/null); then
     # Get function details
-    FUNCTION_STATUS=$(gcloud functions describe $FUNCTION_NAME --region=$FUNCTION_REGION --format="value(status)")
-    FUNCTION_TRIGGER=$(gcloud functions describe $FUNCTION_NAME --region=$FUNCTION_REGION --format="value(eventTrigger.eventType)")
+    FUNCTION_STATUS=$(jq -r '.status // empty' <<< "$FUNCTION_JSON")
+    FUNCTION_TRIGGER=$(jq -r '.eventTrigger.eventType // empty' <<< "$FUNCTION_JSON")
     
     if [ "$FUNCTION_STATUS" = "ACTIVE" ]; then
         check_status "Function deployed" "ok" "Status: $FUNCTION_STATUS, Trigger: $FUNCTION_TRIGGER"
@@ -94,18 +97,18 @@ fi
 
 # 3. Check Workflow
 echo -e "\n${BLUE}3. Checking Workflow...${NC}"
-if gcloud workflows describe $WORKFLOW_NAME --location=$WORKFLOW_REGION &> /dev/null; then
-    WORKFLOW_STATE=$(gcloud workflows describe $WORKFLOW_NAME --location=$WORKFLOW_REGION --format="value(state)")
+if WORKFLOW_STATE=$(gcloud workflows describe $WORKFLOW_NAME --location=$WORKFLOW_REGION --format="value(state)" 2> /dev/null); then
     
     if [ "$WORKFLOW_STATE" = "ACTIVE" ]; then
         check_status "Workflow deployed" "ok" "State: $WORKFLOW_STATE"
         
-        # Check recent executions
-        EXEC_COUNT=$(gcloud workflows executions list $WORKFLOW_NAME --location=$WORKFLOW_REGION --limit=5 --format=json | jq length)
+        # Check recent executions (one listing serves both counts)
+        EXECUTIONS_JSON=$(gcloud workflows executions list $WORKFLOW_NAME --location=$WORKFLOW_REGION --limit=10 --format=json)
+        EXEC_COUNT=$(jq length <<< "$EXECUTIONS_JSON")
         if [ "$EXEC_COUNT" -eq 0 ]; then
             check_status "Workflow executions" "warning" "No executions found yet"
         else
-            FAILED_COUNT=$(gcloud workflows executions list $WORKFLOW_NAME --location=$WORKFLOW_REGION --limit=10 --format=json | jq '[.[] | select(.state == "FAILED")] | length')
+            FAILED_COUNT=$(jq '[.[] | select(.state == "FAILED")] | length' <<< "$EXECUTIONS_JSON")
             if [ "$FAILED_COUNT" -gt 0 ]; then
                 check_status "Workflow executions" "warning" "$FAILED_COUNT failed executions in last 10"
             else
@@ -183,18 +186,31 @@ Equity: \$500,000
 This is a test document for the automated training pipeline.
 EOF
 
-# Convert to PDF using Python if available
-if command -v python3 &> /dev/null && python3 -c "import reportlab" 2>/dev/null; then
-    python3 << EOF
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-c = canvas.Canvas("test_document.pdf", pagesize=letter)
+# Convert to PDF with a hand-rolled single-page PDF (no third-party packages needed)
+if command -v python3 &> /dev/null; then
+    python3 << 'EOF'
 with open("test_financial_statement.txt", "r") as f:
-    y = 750
-    for line in f:
-        c.drawString(100, y, line.strip())
-        y -= 20
-c.save()
+    lines = [line.rstrip("\n") for line in f]
+escape = lambda s: s.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+stream = "BT /F1 12 Tf 100 750 Td 20 TL " + " ".join(f"({escape(line)}) '" for line in lines) + " ET"
+objects = [
+    "<< /Type /Catalog /Pages 2 0 R >>",
+    "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+    "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+    f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream",
+    "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+]
+pdf = "%PDF-1.4\n"
+offsets = []
+for i, obj in enumerate(objects, 1):
+    offsets.append(len(pdf))
+    pdf += f"{i} 0 obj\n{obj}\nendobj\n"
+xref = len(pdf)
+pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+pdf += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+with open("test_document.pdf", "wb") as f:
+    f.write(pdf.encode("latin-1"))
 print("Created test_document.pdf")
 EOF
     
@@ -204,7 +220,7 @@ EOF
     check_status "Test upload" "ok" "Document uploaded successfully"
     rm test_document.pdf test_financial_statement.txt
 else
-    check_status "Test upload" "warning" "Python/reportlab not available. Upload PDFs manually to gs://$BUCKET_NAME/documents/"
+    check_status "Test upload" "warning" "Python not available. Upload PDFs manually to gs://$BUCKET_NAME/documents/"
     rm test_financial_statement.txt
 fi
 